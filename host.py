@@ -0,0 +1,294 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date
+
+import telebot
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+import warming
+from venues import get_venue_data, reload_venue_data
+
+load_dotenv()
+
+# Default path to the multi-bot configuration, see bots.example.json
+DEFAULT_CONFIG_PATH = "bots.json"
+
+# Same model configuration as main.py
+generation_config = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192,
+    "response_mime_type": "text/plain",
+}
+
+BUSY_MESSAGE = "Sorry, I'm a bit busy right now, please try again in a minute! 🙏"
+
+# Models keyed by (model name, system instruction) so bots with the same persona and data share one,
+# with the number of bots using each so unused ones can be dropped
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_config(config_path):
+    """Read the host configuration and fill in the defaults for each bot."""
+    with open(config_path) as file:
+        config = json.load(file)
+
+    gemini = config.setdefault("gemini", {})
+    gemini.setdefault("model_name", "gemini-1.5-flash")
+    gemini.setdefault("max_concurrent_requests", 8)
+
+    warming_settings = config.setdefault("warming", {})
+    # Tokens warming may spend per day, shared by all bots
+    warming_settings.setdefault("token_budget", 200000)
+    warming_settings.setdefault("top_n", 30)
+    warming_settings.setdefault("window_hours", 168)
+    warming_settings.setdefault("ttl_minutes", 360)
+    # Kept well under the Gemini limit so warming leaves room for user messages
+    warming_settings.setdefault("max_workers", 2)
+    warming_settings.setdefault("peaks", [{"day": "thursday", "hour": 19}, {"day": "friday", "hour": 19}])
+    warming_settings.setdefault("lead_minutes", 60)
+    warming_settings.setdefault("check_interval", 60)
+    warming_settings.setdefault("traffic_log", None)
+    for peak in warming_settings["peaks"]:
+        hour = peak.get("hour")
+        if str(peak.get("day", "")).lower() not in warming.DAYS or not isinstance(hour, int) or not 0 <= hour <= 23:
+            raise ValueError(f"Warming peak {peak} needs a day of the week and an hour from 0 to 23.")
+
+    if not config.get("bots"):
+        raise ValueError(f"No bots configured in {config_path}.")
+    for bot_config in config["bots"]:
+        for key in ("name", "token_env", "data_file", "system_instruction"):
+            if key not in bot_config:
+                raise ValueError(f"Bot {bot_config.get('name', '?')} is missing '{key}'.")
+    # Two bots can't poll one token, and the traffic log tells bots apart by name
+    for key in ("name", "token_env"):
+        values = [bot_config[key] for bot_config in config["bots"]]
+        duplicates = sorted({value for value in values if values.count(value) > 1})
+        if duplicates:
+            raise ValueError(f"Bots must have a unique '{key}', found duplicates: {', '.join(duplicates)}.")
+    for bot_config in config["bots"]:
+        bot_config.setdefault("model_name", gemini["model_name"])
+        bot_config.setdefault("max_concurrent_requests", 2)
+        bot_config.setdefault("queue_timeout", 30)
+        bot_config.setdefault("history_file", None)
+        bot_config.setdefault("max_sessions", 1000)
+    return config
+
+def get_model(model_name, system_instruction):
+    """Return the shared Gemini model for a model name and system instruction.
+
+    Every call must be matched by a release_model call once the caller stops using it.
+    """
+    key = (model_name, system_instruction)
+    with _models_lock:
+        if key not in _models:
+            model = genai.GenerativeModel(
+                model_name=model_name,
+                generation_config=generation_config,
+                system_instruction=system_instruction,
+            )
+            _models[key] = [model, 0]
+        _models[key][1] += 1
+        return _models[key][0]
+
+def release_model(model_name, system_instruction):
+    """Stop using a shared model, dropping it (and its copy of the venue data) once no bot does."""
+    key = (model_name, system_instruction)
+    with _models_lock:
+        _models[key][1] -= 1
+        if _models[key][1] == 0:
+            del _models[key]
+
+def apply_venue_data(tenant, venue_data):
+    """Point a tenant at (new) venue data, rebuilding its model and dropping warm answers."""
+    # Give the model the venue data itself rather than only telling it about the sheet
+    system_instruction = f"{tenant['config']['system_instruction']}\n\nVenue data:\n{venue_data['text']}"
+    model = get_model(tenant["config"]["model_name"], system_instruction)
+    if "system_instruction" in tenant:
+        release_model(tenant["config"]["model_name"], tenant["system_instruction"])
+    tenant["venue_data"] = venue_data
+    tenant["categories"] = warming.get_categories(venue_data)
+    tenant["system_instruction"] = system_instruction
+    tenant["model"] = model
+    with tenant["sessions_lock"]:
+        for session in tenant["sessions"].values():
+            session["chat"].model = model
+    warming.clear_cache(tenant)
+
+def load_history(history_file):
+    """Read the starter conversation every chat begins with, or an empty one if none is set."""
+    if not history_file:
+        return []
+    with open(history_file) as file:
+        return json.load(file)
+
+def build_tenant(bot_config, gemini_slots, warming_settings):
+    """Create the Telegram bot for one configured persona and register its handler."""
+    token = os.getenv(bot_config["token_env"])
+    if not token:
+        raise ValueError(f"Environment variable {bot_config['token_env']} is not set for bot {bot_config['name']}.")
+
+    # The worker pool size is the tenant's quota of messages handled at once
+    bot = telebot.TeleBot(token, parse_mode=None, num_threads=bot_config["max_concurrent_requests"])
+    tenant = {
+        "name": bot_config["name"],
+        "config": bot_config,
+        "bot": bot,
+        "history": load_history(bot_config["history_file"]),
+        "sessions": OrderedDict(),
+        "sessions_lock": threading.Lock(),
+        "gemini_slots": gemini_slots,
+        "warming": warming_settings,
+        "answer_cache": {},
+        "cache_lock": threading.Lock(),
+        "traffic": deque(maxlen=10000),
+        "data_mtime": os.path.getmtime(bot_config["data_file"]),
+    }
+    apply_venue_data(tenant, get_venue_data(bot_config["data_file"]))
+    warming.load_traffic_log(tenant)
+
+    @bot.message_handler(func=lambda m: True)
+    def reply(message):
+        bot.reply_to(message, generate_tenant_response(tenant, message.chat.id, message.text))
+
+    return tenant
+
+def get_chat_session(tenant, chat_id):
+    """Return the session for a Telegram chat, starting one if needed.
+
+    A session holds the Gemini chat, a lock so the chat handles one message at a time, and
+    whether every turn so far was a plain lookup.
+
+    Only the most recently used max_sessions chats are kept; older ones start over.
+    """
+    sessions = tenant["sessions"]
+    with tenant["sessions_lock"]:
+        if chat_id in sessions:
+            sessions.move_to_end(chat_id)
+        else:
+            sessions[chat_id] = {
+                "chat": tenant["model"].start_chat(history=list(tenant["history"])),
+                "lock": threading.Lock(),
+                "plain": True,
+            }
+            while len(sessions) > tenant["config"]["max_sessions"]:
+                sessions.popitem(last=False)
+        return sessions[chat_id]
+
+def generate_tenant_response(tenant, chat_id, user_message):
+    """Send a message to Gemini in the chat's own session, within the shared request limit.
+
+    Plain lookups that have a warm answer are answered from the cache instead, as long as
+    nothing earlier in the chat could change the answer.
+    """
+    session = get_chat_session(tenant, chat_id)
+    chat_session = session["chat"]
+    key, plain_lookup = warming.parse_query(user_message, tenant["venue_data"]["cities"], tenant["categories"])
+    if key is not None:
+        warming.record_query(tenant, key)
+    # Chat sessions keep history, so one message per chat at a time
+    with session["lock"]:
+        session["plain"] = session["plain"] and plain_lookup
+        answer = warming.get_cached_answer(tenant, key) if key is not None and session["plain"] else None
+        if answer is not None:
+            # Keep the exchange in the history so follow-up questions still have context
+            chat_session.history = chat_session.history + [
+                {"role": "user", "parts": [user_message]},
+                {"role": "model", "parts": [answer]},
+            ]
+            return answer
+        if not tenant["gemini_slots"].acquire(timeout=tenant["config"]["queue_timeout"]):
+            print(f"[{tenant['name']}] Gemini busy, dropped message from chat {chat_id}")
+            return BUSY_MESSAGE
+        try:
+            response = chat_session.send_message(user_message)
+        finally:
+            tenant["gemini_slots"].release()
+    return response.text
+
+def warm_all(tenants, settings, spent):
+    """Warm every tenant's popular answers out of what is left of today's token budget.
+
+    spent is a {"day", "tokens"} dict the scheduler keeps between runs.
+    """
+    warming.trim_traffic_log(settings)
+    if spent["day"] != date.today():
+        spent["day"] = date.today()
+        spent["tokens"] = 0
+    for tenant in tenants:
+        budget = settings["token_budget"] - spent["tokens"]
+        if budget <= 0:
+            print("Daily warming token budget used up")
+            break
+        spent["tokens"] += warming.warm_tenant(tenant, budget)
+
+def reload_changed_data(tenants):
+    """Reload any venue file that has changed on disk, returning True if anything was reloaded."""
+    reloaded = {}
+    for tenant in tenants:
+        data_file = tenant["config"]["data_file"]
+        mtime = os.path.getmtime(data_file)
+        if mtime == tenant["data_mtime"]:
+            continue
+        if data_file not in reloaded:
+            print(f"Reloading changed venue data '{data_file}'")
+            reloaded[data_file] = reload_venue_data(data_file)
+        apply_venue_data(tenant, reloaded[data_file])
+        tenant["data_mtime"] = mtime
+    return bool(reloaded)
+
+def run_warming_scheduler(tenants, settings):
+    """Warm popular answers at startup, before each expected peak and after each data reload."""
+    spent = {"day": None, "tokens": 0}
+    warmed_peaks = set()
+    started = False
+    while True:
+        try:
+            if not started:
+                started = True
+                warm_all(tenants, settings, spent)
+            if reload_changed_data(tenants):
+                warm_all(tenants, settings, spent)
+            peak = warming.due_peak(settings["peaks"], settings["lead_minutes"], warmed_peaks)
+            if peak is not None:
+                print(f"Warming answers ahead of the peak at {peak:%A %H:%M}")
+                warmed_peaks.add(peak)
+                warm_all(tenants, settings, spent)
+        except Exception as error:
+            print(f"Warming failed: {error}")
+        time.sleep(settings["check_interval"])
+
+def run(config_path=DEFAULT_CONFIG_PATH):
+    """Start every configured bot in this process and poll until interrupted."""
+    config = load_config(config_path)
+
+    # One configure call per process: every model shares the same Gemini client and gRPC channel
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    gemini_slots = threading.BoundedSemaphore(config["gemini"]["max_concurrent_requests"])
+
+    tenants = [build_tenant(bot_config, gemini_slots, config["warming"]) for bot_config in config["bots"]]
+    threading.Thread(target=run_warming_scheduler, args=(tenants, config["warming"]), name="warming", daemon=True).start()
+
+    threads = []
+    for tenant in tenants:
+        thread = threading.Thread(target=tenant["bot"].infinity_polling, name=tenant["name"], daemon=True)
+        thread.start()
+        threads.append(thread)
+        print(f"Started bot '{tenant['name']}'")
+
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        for tenant in tenants:
+            tenant["bot"].stop_polling()
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG_PATH)
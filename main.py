@@ -1,10 +1,9 @@
 import telebot
 import os
-import pandas as pd
 import google.generativeai as genai
 from dotenv import load_dotenv
 import csv
-import PyPDF2
+from venues import read_pdf
 
 load_dotenv()
 
@@ -20,25 +19,6 @@ bot = telebot.TeleBot(telegram_token, parse_mode=None)
 # Configure the API key for Gemini
 genai.configure(api_key=gemini_api_key)
 
-def read_local_excel(file_path):
-    """Read the local Excel file and return its content."""
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"The file {file_path} does not exist.")
-    
-    excel_data = pd.ExcelFile(file_path)
-    print(f"Loaded file '{file_path}' with sheet names: {excel_data.sheet_names}")
-    return excel_data
-
-def read_pdf(file_path):
-    """Read a PDF file and extract text content."""
-    with open(file_path, "rb") as file:
-        reader = PyPDF2.PdfReader(file)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text()
-    print(f"Loaded PDF file '{file_path}' with {len(reader.pages)} pages.")
-    return text
-
 def generate_gemini_response(chat_session, user_message, excel_data):
     """Generate a response using Gemini and include information from the Excel file if relevant."""
     # Send the user's message to Gemini and get the response
@@ -0,0 +1,67 @@
+import os
+import threading
+
+import pandas as pd
+import PyPDF2
+
+# Sheets in the workbook that don't describe a city
+NON_CITY_SHEETS = {"References"}
+
+# Loaded venue data, keyed by absolute file path so bots sharing a file share one copy
+_venue_store = {}
+_venue_store_lock = threading.Lock()
+
+
+def read_local_excel(file_path):
+    """Read the local Excel file and return its content."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"The file {file_path} does not exist.")
+
+    excel_data = pd.ExcelFile(file_path)
+    print(f"Loaded file '{file_path}' with sheet names: {excel_data.sheet_names}")
+    return excel_data
+
+def read_pdf(file_path):
+    """Read a PDF file and extract text content."""
+    with open(file_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        text = ''
+        for page in reader.pages:
+            text += page.extract_text()
+    print(f"Loaded PDF file '{file_path}' with {len(reader.pages)} pages.")
+    return text
+
+def _load_venue_data(file_path):
+    """Read a venue file into a dict with the prompt text and a DataFrame per city."""
+    if file_path.lower().endswith(".pdf"):
+        return {"text": read_pdf(file_path), "cities": {}}
+
+    excel_data = read_local_excel(file_path)
+    cities = {}
+    sections = []
+    for sheet_name in excel_data.sheet_names:
+        if sheet_name in NON_CITY_SHEETS:
+            continue
+        sheet = excel_data.parse(sheet_name).dropna(how="all")
+        cities[sheet_name] = sheet
+        sections.append(f"## {sheet_name}\n{sheet.to_csv(index=False)}")
+    return {"text": "\n".join(sections), "cities": cities}
+
+def get_venue_data(file_path):
+    """Return the venue data for a file, loading it only the first time it is asked for.
+
+    The returned data is shared between every caller and must be treated as read-only.
+    """
+    key = os.path.abspath(file_path)
+    with _venue_store_lock:
+        if key not in _venue_store:
+            _venue_store[key] = _load_venue_data(key)
+        return _venue_store[key]
+
+def reload_venue_data(file_path):
+    """Read a venue file again and replace the shared copy, returning the new data."""
+    key = os.path.abspath(file_path)
+    venue_data = _load_venue_data(key)
+    with _venue_store_lock:
+        _venue_store[key] = venue_data
+    return venue_data
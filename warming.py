@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Words users use for a time of day, mapped onto the slots used in the sheets' Time column
+SLOT_WORDS = {
+    "morning": "morning",
+    "breakfast": "morning",
+    "daytime": "day",
+    "afternoon": "day",
+    "lunch": "day",
+    "evening": "evening",
+    "dinner": "evening",
+    "night": "night",
+    "tonight": "night",
+    "late": "night",
+}
+
+# Words that carry no meaning for the lookup, so a message made of these plus a key is a plain lookup
+FILLER_WORDS = {
+    "a", "an", "and", "any", "anything", "are", "at", "be", "can", "do", "for", "go", "going",
+    "gonna", "good", "hey", "hi", "i", "i'm", "im", "in", "is", "it", "looking", "me", "my", "of",
+    "on", "or", "out", "places", "please", "recommend", "should", "some", "spots", "the", "there",
+    "this", "to", "want", "what", "what's", "whats", "where", "will", "with", "you",
+}
+
+WARM_PROMPT = "Hi, I'm in {city}. What can I do{when}?{category} Please include the Instagram handles."
+
+# Most tokens a warm answer may use, so the cost of a warm request is bounded up front
+EXPECTED_ANSWER_TOKENS = 1024
+
+_traffic_log_lock = threading.Lock()
+
+
+def _words(text):
+    return re.findall(r"[a-z][a-z'&]*", text.lower())
+
+def get_categories(venue_data):
+    """Return the venue categories (from the sheets' Type column) as lowercase words."""
+    categories = set()
+    for sheet in venue_data["cities"].values():
+        if "Type" not in sheet:
+            continue
+        for value in sheet["Type"].dropna():
+            categories.update(part.strip().lower() for part in str(value).split("/") if part.strip())
+    return categories
+
+def parse_query(text, cities, categories):
+    """Work out the (city, day, slot, category) a message asks about.
+
+    Returns the key (or None if no city is mentioned) and whether the message is a plain
+    lookup, i.e. it has no other words that could change the answer. A message without a
+    city is plain only if it is nothing but filler, like a greeting.
+    """
+    lowered = text.lower()
+    city = None
+    city_words = set()
+    for name in cities:
+        # "Birmingham, West Midlands" is matched on "birmingham"
+        short_name = name.split(",")[0].lower()
+        if re.search(rf"\b{re.escape(short_name)}\b", lowered):
+            city = name
+            city_words = set(_words(short_name))
+            break
+    day = slot = category = None
+    # Dates and times like "18/10" or "2am" aren't covered by the key
+    unmatched = 1 if re.search(r"\d", text) else 0
+    words = _words(text)
+    for index, word in enumerate(words):
+        # "am" is filler in "i am", but otherwise a time like "2 am"
+        if word == "am" and index > 0 and words[index - 1] == "i":
+            continue
+        if word in city_words or word in FILLER_WORDS:
+            continue
+        # A second, different day, slot or category isn't covered by the key
+        if word in DAYS or word == "weekend":
+            if day not in (None, word):
+                unmatched += 1
+            day = day or word
+        elif word in SLOT_WORDS:
+            if slot not in (None, SLOT_WORDS[word]):
+                unmatched += 1
+            slot = slot or SLOT_WORDS[word]
+        elif word in categories or word.rstrip("s") in categories:
+            word = word if word in categories else word.rstrip("s")
+            if category not in (None, word):
+                unmatched += 1
+            category = category or word
+        else:
+            unmatched += 1
+    if city is None:
+        return None, unmatched == 0 and day is None and slot is None and category is None
+    return (city, day, slot, category), unmatched == 0
+
+def record_query(tenant, key):
+    """Add a parsed query to the tenant's recent traffic and the traffic log, if one is set."""
+    now = time.time()
+    tenant["traffic"].append((now, key))
+    log_path = tenant["warming"].get("traffic_log")
+    if log_path:
+        with _traffic_log_lock, open(log_path, "a") as file:
+            file.write(json.dumps({"bot": tenant["name"], "time": now, "key": key}) + "\n")
+
+def trim_traffic_log(settings):
+    """Rewrite the traffic log without entries older than the window, returning the ones kept.
+
+    Lines that can't be read, like one cut short by a crash, are dropped.
+    """
+    log_path = settings.get("traffic_log")
+    if not log_path or not os.path.exists(log_path):
+        return []
+    since = time.time() - settings["window_hours"] * 3600
+    kept = []
+    with _traffic_log_lock:
+        with open(log_path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    if entry["time"] >= since:
+                        kept.append(entry)
+                except (ValueError, KeyError, TypeError):
+                    continue
+        with open(f"{log_path}.tmp", "w") as file:
+            for entry in kept:
+                file.write(json.dumps(entry) + "\n")
+        os.replace(f"{log_path}.tmp", log_path)
+    return kept
+
+def load_traffic_log(tenant):
+    """Fill the tenant's recent traffic from the traffic log so a restart doesn't forget it."""
+    for entry in trim_traffic_log(tenant["warming"]):
+        if entry.get("bot") == tenant["name"] and isinstance(entry.get("key"), list) and len(entry["key"]) == 4:
+            tenant["traffic"].append((entry["time"], tuple(entry["key"])))
+
+def get_cached_answer(tenant, key):
+    """Return the warm answer for a key, or None if there isn't a fresh one."""
+    with tenant["cache_lock"]:
+        entry = tenant["answer_cache"].get(key)
+    if entry is None:
+        return None
+    answer, created_at = entry
+    if time.time() - created_at > tenant["warming"]["ttl_minutes"] * 60:
+        return None
+    return answer
+
+def clear_cache(tenant):
+    """Drop every warm answer, e.g. after the venue data has changed."""
+    with tenant["cache_lock"]:
+        tenant["answer_cache"].clear()
+
+def popular_keys(tenant):
+    """Return the keys asked about in the recent window, most frequent first."""
+    since = time.time() - tenant["warming"]["window_hours"] * 3600
+    counts = Counter(key for asked_at, key in list(tenant["traffic"]) if asked_at >= since)
+    return [key for key, _ in counts.most_common()]
+
+def build_warm_prompt(key):
+    """Write the question a user would send for a key."""
+    city, day, slot, category = key
+    when = " ".join(part for part in (day, slot) if part)
+    return WARM_PROMPT.format(
+        city=city.split(",")[0],
+        when=f" on {when}" if when else "",
+        category=f" I'm looking for a {category}." if category else "",
+    )
+
+def _warm_key(tenant, key):
+    """Generate and cache the answer for one key, returning the tokens it used.
+
+    Warming never waits for a Gemini slot: if user messages are using them all, the key is
+    skipped and None is returned.
+    """
+    if not tenant["gemini_slots"].acquire(blocking=False):
+        return None
+    try:
+        # Start from the same history as a live chat so the answer matches what it would get
+        chat_session = tenant["model"].start_chat(history=list(tenant["history"]))
+        response = chat_session.send_message(
+            build_warm_prompt(key),
+            generation_config={"max_output_tokens": EXPECTED_ANSWER_TOKENS},
+        )
+    finally:
+        tenant["gemini_slots"].release()
+    # An answer cut off at the token cap isn't worth serving, but its tokens are still spent
+    if response.candidates[0].finish_reason.name == "MAX_TOKENS":
+        print(f"[{tenant['name']}] Warm answer for {key} was cut off, not caching it")
+        return response.usage_metadata.total_token_count
+    with tenant["cache_lock"]:
+        tenant["answer_cache"][key] = (response.text, time.time())
+    return response.usage_metadata.total_token_count
+
+def warm_tenant(tenant, token_budget):
+    """Precompute answers for the tenant's most popular queries without going over the token budget.
+
+    Returns the number of tokens used.
+    """
+    settings = tenant["warming"]
+    # The system instruction and starter history are sent with every warm request
+    context_tokens = (len(tenant["system_instruction"]) + len(json.dumps(tenant["history"]))) // 4
+    estimates = {}
+    reserved = 0
+    for key in popular_keys(tenant)[:settings["top_n"]]:
+        if get_cached_answer(tenant, key) is not None:
+            continue
+        estimate = context_tokens + len(build_warm_prompt(key)) // 4 + EXPECTED_ANSWER_TOKENS
+        if reserved + estimate > token_budget:
+            break
+        estimates[key] = estimate
+        reserved += estimate
+    if not estimates:
+        return 0
+
+    used = 0
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=settings["max_workers"]) as pool:
+        futures = {pool.submit(_warm_key, tenant, key): key for key in estimates}
+        for future, key in futures.items():
+            try:
+                tokens = future.result()
+            except Exception as error:
+                # A failed request (e.g. a blocked answer) may still have cost tokens
+                print(f"[{tenant['name']}] Failed to warm {key}: {error}")
+                used += estimates[key]
+                continue
+            if tokens is None:
+                skipped += 1
+            else:
+                used += tokens
+    print(f"[{tenant['name']}] Warmed {len(estimates) - skipped} answers using {used} tokens, skipped {skipped} while Gemini was busy")
+    return used
+
+def due_peak(peaks, lead_minutes, warmed_peaks, now=None):
+    """Return the upcoming peak that starts within the lead time and hasn't been warmed yet, if any."""
+    now = now or datetime.now()
+    for peak in peaks:
+        days_ahead = (DAYS.index(peak["day"].lower()) - now.weekday()) % 7
+        starts_at = (now + timedelta(days=days_ahead)).replace(hour=peak["hour"], minute=0, second=0, microsecond=0)
+        if starts_at < now:
+            continue
+        if starts_at - now <= timedelta(minutes=lead_minutes) and starts_at not in warmed_peaks:
+            return starts_at
+    return None